@@ -0,0 +1,25 @@
+"""
+Similarity kernels compiled with Numba, used when SimSIMD is not installed.
+
+Importing this module raises ImportError if Numba is not available.
+"""
+
+from numba import literally, njit, prange
+import numpy as np
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def dot_scores(matrix, query, out, dimensions):
+    """
+    Write the dot product of query with each row of matrix to out.
+
+    literally() compiles a separate kernel for each value of dimensions, so
+    the inner loop has a constant trip count that LLVM can fully unroll into
+    SIMD instructions. Each specialization is cached on disk after its first use.
+    """
+    literally(dimensions)
+    for i in prange(matrix.shape[0]):
+        total = np.float32(0.0)
+        for j in range(dimensions):
+            total += matrix[i, j] * query[j]
+        out[i] = total
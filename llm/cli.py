@@ -1597,7 +1597,11 @@ def embed_multi(
 @click.option("-c", "--content", help="Content to embed for comparison")
 @click.option("--binary", is_flag=True, help="Treat input as binary data")
 @click.option(
-    "-n", "--number", type=int, default=10, help="Number of results to return"
+    "-n",
+    "--number",
+    type=click.IntRange(min=0),
+    default=10,
+    help="Number of results to return",
 )
 @click.option(
     "-d",
@@ -1,13 +1,321 @@
 from .models import EmbeddingModel
 from .embeddings_migrations import embeddings_migrations
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+import functools
 import hashlib
+import heapq
+import importlib
 from itertools import islice
 import json
+import math
+import os
+import secrets
 from sqlite_utils import Database
 from sqlite_utils.db import Table
+import struct
+import tempfile
 import time
-from typing import cast, Any, Dict, Iterable, List, Optional, Tuple, Union
+from typing import (
+    cast,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _optional_import(name: str) -> Any:
+    """
+    Import an optional dependency on first use - returns None if it is not
+    installed. Importing NumPy alone would add noticeably to the startup time
+    of every llm command, including ones that never touch embeddings.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def _numpy() -> Any:
+    return _optional_import("numpy")
+
+
+def _simsimd() -> Any:
+    return _optional_import("simsimd")
+
+
+def _orjson() -> Any:
+    return _optional_import("orjson")
+
+
+def _threadpoolctl() -> Any:
+    return _optional_import("threadpoolctl")
+
+
+# Searches over at least this many rows are split across CPU cores
+PARALLEL_SCAN_ROWS = 50_000
+
+# Supported values for Collection(quantization=) and their NumPy storage dtypes
+QUANTIZATIONS = {None: "<f4", "i8": "i1", "f16": "<f2"}
+
+
+def _is_plain_json(value: Any) -> bool:
+    """
+    Is value built only from types that orjson and json.dumps() both accept and
+    decode back to the same thing? Anything else - NaN or infinity, which orjson
+    writes as null, integers beyond 64 bits, or types that only orjson accepts
+    such as datetime, UUID or dataclasses - is left to json.dumps().
+    """
+    kind = type(value)
+    if value is None or kind is str or kind is bool:
+        return True
+    if kind is int:
+        return -(2**63) <= value < 2**64
+    if kind is float:
+        return math.isfinite(value)
+    if kind is dict:
+        return all(
+            type(key) in (str, int) and _is_plain_json(item)
+            for key, item in value.items()
+        )
+    if kind is list or kind is tuple:
+        return all(_is_plain_json(item) for item in value)
+    return False
+
+
+def _json_dumps(value: Any) -> str:
+    """
+    Serialize metadata using orjson if it is installed, which is much faster.
+
+    orjson writes more compact JSON - no spaces after separators, and non-ASCII
+    characters are not escaped - but only for values where it decodes to the
+    same result, so which values can be stored doesn't depend on orjson.
+    """
+    orjson = _orjson()
+    if orjson is not None and _is_plain_json(value):
+        try:
+            return orjson.dumps(
+                value,
+                option=orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_PASSTHROUGH_DATETIME
+                | orjson.OPT_PASSTHROUGH_DATACLASS
+                | orjson.OPT_PASSTHROUGH_SUBCLASS,
+            ).decode("utf-8")
+        except orjson.JSONEncodeError:
+            # Such as nesting deeper than orjson supports
+            pass
+    return json.dumps(value)
+
+
+def _json_loads(value: Union[str, bytes]) -> Any:
+    orjson = _orjson()
+    if orjson is not None:
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError:
+            # json.dumps() writes NaN and Infinity, which orjson won't read
+            pass
+    return json.loads(value)
+
+
+def _unit_vector(values: Iterable[float]) -> List[float]:
+    "Scale a vector to a length of 1, leaving a zero vector unchanged"
+    values = list(values)
+    magnitude = sum(x * x for x in values) ** 0.5 or 1.0
+    return [x / magnitude for x in values]
+
+
+def quantize_i8(values: Iterable[float]) -> Tuple[bytes, float]:
+    """
+    Normalize a vector and quantize it to signed 8-bit integers, returning the
+    encoded bytes and the scale that maps the normalized vector onto them.
+    """
+    values = _unit_vector(values)
+    largest = max((abs(x) for x in values), default=0.0)
+    scale = 127 / largest if largest else 1.0
+    return (
+        struct.pack("<" + "b" * len(values), *(round(x * scale) for x in values)),
+        scale,
+    )
+
+
+def dequantize_i8(binary: bytes, scale: float) -> List[float]:
+    "Decode bytes produced by quantize_i8() back into a normalized vector"
+    return [x / scale for x in struct.unpack("<" + "b" * len(binary), binary)]
+
+
+def _decode_matrix(blobs: List[bytes], dtype: str = "<f4"):
+    "Decode a list of same-length embedding blobs into an (N, D) matrix"
+    np = _numpy()
+    if not blobs:
+        return np.empty((0, 0), dtype=dtype)
+    itemsize = np.dtype(dtype).itemsize
+    dimensions = len(blobs[0]) // itemsize
+    # A single copy into one writable buffer, rather than a decode call per row
+    buffer = bytearray().join(blobs)
+    if len(buffer) != len(blobs) * dimensions * itemsize:
+        raise ValueError("Embeddings in a collection must all have the same length")
+    return np.frombuffer(buffer, dtype=dtype).reshape(len(blobs), dimensions)
+
+
+def _normalize_rows(matrix) -> None:
+    "Scale each row of a float matrix to unit length, in place"
+    np = _numpy()
+    # Accumulate in float32 so float16 sums of squares can't overflow
+    norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix, dtype=np.float32))
+    norms[norms == 0] = 1
+    matrix /= norms.astype(matrix.dtype)[:, None]
+
+
+@functools.lru_cache(maxsize=None)
+def _blas_is_threaded() -> bool:
+    "Does NumPy's BLAS library already use multiple threads for matrix products?"
+    threadpoolctl = _threadpoolctl()
+    if threadpoolctl is not None:
+        return any(
+            info["user_api"] == "blas" and info["num_threads"] > 1
+            for info in threadpoolctl.threadpool_info()
+        )
+    # Otherwise check the environment variables that OpenBLAS and MKL read
+    # their thread count from, and if none are set assume it does - most
+    # builds of those libraries use every core by default
+    return not any(
+        os.environ.get(name, "").strip() == "1"
+        for name in ("OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "OMP_NUM_THREADS")
+    )
+
+
+def _scan_threads(rows: int) -> int:
+    "Number of threads to use when scoring a matrix with this many rows"
+    if rows < PARALLEL_SCAN_ROWS:
+        return 1
+    return os.cpu_count() or 1
+
+
+@functools.lru_cache(maxsize=None)
+def _numba_kernels():
+    "Import the Numba kernels on first use - returns None if Numba is not installed"
+    try:
+        from . import _simd_kernels
+    except ImportError:
+        return None
+    return _simd_kernels
+
+
+def _matrix_vector_product(matrix, vector):
+    "matrix @ vector, split into row chunks across threads if BLAS is single-threaded"
+    np = _numpy()
+    threads = _scan_threads(len(matrix))
+    if threads == 1 or _blas_is_threaded():
+        return matrix @ vector
+    # NumPy releases the GIL during the product, so the chunks run in parallel
+    with ThreadPoolExecutor(threads) as executor:
+        return np.concatenate(
+            list(
+                executor.map(
+                    lambda chunk: chunk @ vector, np.array_split(matrix, threads)
+                )
+            )
+        )
+
+
+def _cosine_scores(matrix, query):
+    """
+    Cosine similarity between query and every row of an (N, D) matrix.
+
+    Float matrices must have been normalized with _normalize_rows(), which
+    reduces cosine similarity to a dot product with the normalized query.
+    Without SimSIMD the matrix must be float32, see Collection._scoring_matrix().
+    """
+    np = _numpy()
+    simsimd = _simsimd()
+    if matrix.dtype == np.int8:
+        query = np.frombuffer(quantize_i8(query.tolist())[0], dtype=np.int8)
+        # cdist dispatches to the best SIMD kernel for this CPU and returns distances
+        distances = simsimd.cdist(
+            query[None, :],
+            matrix,
+            metric="cosine",
+            threads=_scan_threads(len(matrix)),
+        )
+        return 1 - np.asarray(distances)[0]
+    query = query / np.linalg.norm(query)
+    if simsimd is not None:
+        # float16 matrices are scored with the F16C / AVX-512 FP16 kernels
+        scores = simsimd.cdist(
+            query.astype(matrix.dtype)[None, :],
+            matrix,
+            metric="dot",
+            threads=_scan_threads(len(matrix)),
+        )
+        return np.asarray(scores)[0]
+    # Importing and dispatching to Numba only pays off on large scans when
+    # the BLAS matrix product would otherwise run on a single thread
+    kernels = (
+        _numba_kernels()
+        if len(matrix) >= PARALLEL_SCAN_ROWS and not _blas_is_threaded()
+        else None
+    )
+    if kernels is not None:
+        scores = np.empty(len(matrix), dtype=np.float32)
+        kernels.dot_scores(matrix, query.astype(np.float32), scores, matrix.shape[1])
+        return scores
+    return _matrix_vector_product(matrix, query)
+
+
+def _cosine_score_matrix(matrix, queries):
+    """
+    (Q, N) cosine similarities between each row of a (Q, D) queries array and
+    every row of an (N, D) matrix, normalized as for _cosine_scores().
+
+    Float32 matrices are scored with a single matrix-matrix product, so the
+    stored embeddings are read once for all of the queries rather than once each.
+    """
+    np = _numpy()
+    simsimd = _simsimd()
+    if matrix.dtype == np.int8:
+        quantized = np.array(
+            [
+                np.frombuffer(quantize_i8(query.tolist())[0], dtype=np.int8)
+                for query in queries
+            ]
+        )
+        distances = simsimd.cdist(
+            quantized, matrix, metric="cosine", threads=_scan_threads(len(matrix))
+        )
+        return 1 - np.asarray(distances)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    if matrix.dtype == np.float16:
+        scores = simsimd.cdist(
+            queries.astype(np.float16),
+            matrix,
+            metric="dot",
+            threads=_scan_threads(len(matrix)),
+        )
+        return np.asarray(scores)
+    return queries @ matrix.T
+
+
+def _top_k(scores, number: int):
+    """
+    Positions of the highest scores, best first, with ties in position order.
+
+    np.argpartition() selects the candidates in O(N), so only those need sorting.
+    """
+    np = _numpy()
+    if number <= 0:
+        return np.empty(0, dtype=np.intp)
+    if number < len(scores):
+        candidates = np.argpartition(-scores, number - 1)[:number]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
 
 
 @dataclass
@@ -30,6 +338,8 @@ class Collection:
         model: Optional[EmbeddingModel] = None,
         model_id: Optional[str] = None,
         create: bool = True,
+        quantization: Optional[str] = None,
+        mmap: bool = False,
     ) -> None:
         """
         A collection of embeddings
@@ -45,12 +355,37 @@ class Collection:
             model (llm.models.EmbeddingModel, optional): Embedding model to use
             model_id (str, optional): Alternatively, ID of the embedding model to use
             create (bool, optional): Whether to create the collection if it does not exist
+            quantization (str, optional): Store new collections as "i8" 8-bit integers or "f16" 16-bit floats
+            mmap (bool, optional): Keep a memory-mapped copy of the embeddings beside the database file
         """
         import llm
 
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(
+                "quantization= must be one of: {}".format(
+                    ", ".join(repr(q) for q in QUANTIZATIONS)
+                )
+            )
         self.db = db or Database(memory=True)
         self.name = name
         self._model = model
+        self.quantization = quantization
+        self.mmap = mmap
+        # In-memory (N, D) matrix of the stored embeddings with rows normalized
+        # to unit length, used by similar_by_vector() - loaded lazily and
+        # appended to by embed()
+        self._matrix: Any = None
+        self._matrix_count = 0
+        self._ids: List[str] = []
+        self._id_positions: Dict[str, int] = {}
+        self._matrix_version: Optional[Tuple[int, int]] = None
+        self._dirty = True
+        # Normalized float32 copy of an int8 or float16 matrix, for scoring
+        # without SimSIMD - see _scoring_matrix()
+        self._float_matrix: Any = None
+        # Optional USearch HNSW index over the matrix, see build_index()
+        self._use_index = False
+        self._index: Any = None
 
         embeddings_migrations.apply(self.db)
 
@@ -59,6 +394,13 @@ class Collection:
             row = rows[0]
             self.id = row["id"]
             self.model_id = row["model"]
+            if quantization is not None and quantization != row["quantization"]:
+                raise ValueError(
+                    "Collection '{}' was not created with quantization={!r}".format(
+                        name, quantization
+                    )
+                )
+            self.quantization = row["quantization"]
         else:
             if create:
                 # Collection does not exist, so model or model_id is required
@@ -78,6 +420,8 @@ class Collection:
                         {
                             "name": self.name,
                             "model": model_id,
+                            "quantization": quantization,
+                            "token": secrets.token_hex(16),
                         }
                     )
                     .last_pk
@@ -101,16 +445,9 @@ class Collection:
         Returns:
             int: Number of items in the collection
         """
-        return next(
-            self.db.query(
-                """
-            select count(*) as c from embeddings where collection_id = (
-                select id from collections where name = ?
-            )
-            """,
-                (self.name,),
-            )
-        )["c"]
+        return self.db.execute(
+            "select count(*) from embeddings where collection_id = ?", [self.id]
+        ).fetchone()[0]
 
     def embed(
         self,
@@ -128,26 +465,18 @@ class Collection:
             metadata (dict, optional): Metadata to be stored
             store (bool, optional): Whether to store the value in the content or content_blob column
         """
-        from llm import encode
-
         content_hash = self.content_hash(value)
-        if self.db["embeddings"].count_where(
-            "content_hash = ? and collection_id = ?", [content_hash, self.id]
-        ):
+        if self.db.execute(
+            "select 1 from embeddings where content_hash = ? and collection_id = ? limit 1",
+            [content_hash, self.id],
+        ).fetchone():
             return
-        embedding = self.model().embed(value)
-        cast(Table, self.db["embeddings"]).insert(
-            {
-                "collection_id": self.id,
-                "id": id,
-                "embedding": encode(embedding),
-                "content": value if (store and isinstance(value, str)) else None,
-                "content_blob": value if (store and isinstance(value, bytes)) else None,
-                "content_hash": content_hash,
-                "metadata": json.dumps(metadata) if metadata else None,
-                "updated": int(time.time()),
-            },
-            replace=True,
+        # Share the executemany() path with embed_multi(), which avoids the
+        # sqlite-utils table introspection that Table.insert() does on every call
+        self._write_batch(
+            [((id, value, metadata), content_hash)],
+            [self._encode_embedding(self.model().embed(value))],
+            store,
         )
 
     def embed_multi(
@@ -184,58 +513,89 @@ class Collection:
             store (bool, optional): Whether to store the value in the content or content_blob column
             batch_size (int, optional): custom maximum batch size to use
         """
-        import llm
-
-        batch_size = min(batch_size, (self.model().batch_size or batch_size))
+        model = self.model()
+        batch_size = min(batch_size, (model.batch_size or batch_size))
         iterator = iter(entries)
         collection_id = self.id
-        while True:
-            batch = list(islice(iterator, batch_size))
-            if not batch:
-                break
-            # Calculate hashes first
-            items_and_hashes = [(item, self.content_hash(item[1])) for item in batch]
-            # Any of those hashes already exist?
-            existing_ids = [
-                row["id"]
-                for row in self.db.query(
-                    """
-                    select id from embeddings
-                    where collection_id = ? and content_hash in ({})
-                    """.format(
-                        ",".join("?" for _ in items_and_hashes)
-                    ),
-                    [collection_id]
-                    + [item_and_hash[1] for item_and_hash in items_and_hashes],
-                )
+        content_hash = self.content_hash
+        encode_embedding = self._encode_embedding
+
+        def embed_batch(values):
+            return [
+                encode_embedding(embedding) for embedding in model.embed_multi(values)
             ]
-            filtered_batch = [item for item in batch if item[0] not in existing_ids]
-            embeddings = list(
-                self.model().embed_multi(item[1] for item in filtered_batch)
+
+        # Load every stored ID and content hash once, rather than querying per batch
+        existing_hashes: Dict[str, bytes] = dict(
+            self.db.execute(
+                "select id, content_hash from embeddings where collection_id = ?",
+                [collection_id],
+            ).fetchall()
+        )
+
+        # Embed each batch on a worker thread while the previous batch is written
+        # to the database on this one, since SQLite connections can't be shared
+        # between threads
+        pending = None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while True:
+                batch = list(islice(iterator, batch_size))
+                if batch:
+                    # Skip items that are already stored with the same content
+                    filtered_batch = []
+                    for item in batch:
+                        item_hash = content_hash(item[1])
+                        if existing_hashes.get(str(item[0])) != item_hash:
+                            existing_hashes[str(item[0])] = item_hash
+                            filtered_batch.append((item, item_hash))
+                    future = executor.submit(
+                        embed_batch, [item[1] for item, _ in filtered_batch]
+                    )
+                if pending is not None:
+                    self._write_batch(pending[0], pending[1].result(), store)
+                if not batch:
+                    break
+                pending = (filtered_batch, future)
+
+    def _write_batch(
+        self,
+        filtered_batch: List[Tuple[Tuple[Any, Any, Any], bytes]],
+        embeddings: List[Tuple[bytes, Optional[float]]],
+        store: bool,
+    ) -> None:
+        "Store a batch of ((id, value, metadata), content_hash) items and their embeddings"
+        # Serialize every row up front so the batch is a single executemany()
+        updated = int(time.time())
+        collection_id = self.id
+        rows = [
+            (
+                collection_id,
+                id,
+                embedding,
+                embedding_scale,
+                value if (store and isinstance(value, str)) else None,
+                value if (store and isinstance(value, bytes)) else None,
+                content_hash,
+                _json_dumps(metadata) if metadata else None,
+                updated,
             )
-            with self.db.conn:
-                cast(Table, self.db["embeddings"]).insert_all(
-                    (
-                        {
-                            "collection_id": collection_id,
-                            "id": id,
-                            "embedding": llm.encode(embedding),
-                            "content": (
-                                value if (store and isinstance(value, str)) else None
-                            ),
-                            "content_blob": (
-                                value if (store and isinstance(value, bytes)) else None
-                            ),
-                            "content_hash": self.content_hash(value),
-                            "metadata": json.dumps(metadata) if metadata else None,
-                            "updated": int(time.time()),
-                        }
-                        for (embedding, (id, value, metadata)) in zip(
-                            embeddings, filtered_batch
-                        )
-                    ),
-                    replace=True,
-                )
+            for (
+                (embedding, embedding_scale),
+                ((id, value, metadata), content_hash),
+            ) in zip(embeddings, filtered_batch)
+        ]
+        self._check_matrix()
+        with self.db.conn:
+            self.db.conn.executemany(
+                """
+                insert or replace into embeddings (
+                    collection_id, id, embedding, embedding_scale, content,
+                    content_blob, content_hash, metadata, updated
+                ) values (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+        self._append_to_matrix([row[1] for row in rows], [row[2] for row in rows])
 
     def similar_by_vector(
         self, vector: List[float], number: int = 10, skip_id: Optional[str] = None
@@ -250,42 +610,377 @@ class Collection:
         Returns:
             list: List of Entry objects
         """
-        import llm
+        np = _numpy()
+        if number < 0:
+            raise ValueError("number= must not be negative")
+        if not any(vector):
+            raise ValueError("Cannot search by a vector with no magnitude")
+        if np is None:
+            return self._similar_by_vector_python(vector, number, skip_id)
 
-        def distance_score(other_encoded):
-            other_vector = llm.decode(other_encoded)
-            return llm.cosine_similarity(other_vector, vector)
+        matrix = self._load_matrix()
+        if not len(matrix):
+            return []
 
-        self.db.register_function(distance_score, replace=True)
+        query = np.asarray(vector, dtype=np.float32)
+        if self._use_index:
+            return self._similar_by_index(query, number, skip_id)
 
-        where_bits = ["collection_id = ?"]
-        where_args = [str(self.id)]
+        scores = _cosine_scores(self._scoring_matrix(matrix), query)
+        if skip_id is not None and str(skip_id) in self._id_positions:
+            scores[self._id_positions[str(skip_id)]] = -np.inf
 
-        if skip_id:
-            where_bits.append("id != ?")
-            where_args.append(skip_id)
+        positions = [
+            position
+            for position in _top_k(scores, number)
+            if scores[position] != -np.inf
+        ]
+        return self._entries(
+            [self._ids[position] for position in positions],
+            [scores[position] for position in positions],
+        )
 
-        return [
-            Entry(
-                id=row["id"],
-                score=row["score"],
-                content=row["content"],
-                metadata=json.loads(row["metadata"]) if row["metadata"] else None,
+    def similar_by_vectors(
+        self, vectors: Sequence[Sequence[float]], number: int = 10
+    ) -> List[List[Entry]]:
+        """
+        Find similar items in the collection for each of several vectors at once.
+
+        Args:
+            vectors (list or array): Vectors to search by, one per row
+            number (int, optional): Number of similar items to return for each
+
+        Returns:
+            list: A list of Entry objects for each vector, in the same order
+        """
+        np = _numpy()
+        if number < 0:
+            raise ValueError("number= must not be negative")
+        if np is None or self._use_index:
+            return [self.similar_by_vector(list(vector), number) for vector in vectors]
+
+        matrix = self._load_matrix()
+        queries = np.asarray(vectors, dtype=np.float32)
+        if len(queries) and not queries.any(axis=1).all():
+            raise ValueError("Cannot search by a vector with no magnitude")
+        if not len(matrix) or not len(queries):
+            return [[] for _ in queries]
+
+        results = []
+        for scores in _cosine_score_matrix(self._scoring_matrix(matrix), queries):
+            positions = _top_k(scores, number)
+            results.append(
+                self._entries(
+                    [self._ids[position] for position in positions],
+                    [scores[position] for position in positions],
+                )
             )
+        return results
+
+    def build_index(self) -> None:
+        """
+        Build an approximate nearest neighbor (HNSW) index of the collection using
+        USearch, which similar_by_vector() will use from then on instead of scoring
+        every stored embedding. Requires the usearch package.
+
+        The index is held in memory and kept up to date as embeddings are added.
+        """
+        # Import now so a missing package fails here rather than on the first search
+        from usearch.index import Index  # noqa: F401
+
+        self._use_index = True
+        if len(self._load_matrix()):
+            self._build_index()
+
+    def _build_index(self):
+        np = _numpy()
+        from usearch.index import Index
+
+        matrix = self._load_matrix()
+        index = Index(
+            ndim=matrix.shape[1],
+            metric="cos",
+            dtype={"i1": "i8", "f2": "f16"}.get(matrix.dtype.str[1:], "f32"),
+        )
+        if len(matrix):
+            index.add(np.arange(len(matrix)), matrix)
+        self._index = index
+        return index
+
+    def _similar_by_index(self, query, number: int, skip_id: Optional[str]):
+        np = _numpy()
+        if number == 0:
+            # USearch crashes rather than returning nothing
+            return []
+        index = self._index if self._index is not None else self._build_index()
+        if self._matrix.dtype == np.int8:
+            query = np.frombuffer(quantize_i8(query.tolist())[0], dtype=np.int8)
+        skip_position = self._id_positions.get(str(skip_id))
+        matches = index.search(query, number + (1 if skip_position is not None else 0))
+        positions_and_scores = [
+            (int(position), 1 - float(distance))
+            for position, distance in zip(matches.keys, matches.distances)
+            if position != skip_position
+        ][:number]
+        return self._entries(
+            [self._ids[position] for position, _ in positions_and_scores],
+            [score for _, score in positions_and_scores],
+        )
+
+    def _entries(self, ids: List[str], scores) -> List[Entry]:
+        "Fetch content and metadata for the given IDs, returning them with their scores"
+        rows = {
+            row["id"]: row
             for row in self.db.query(
                 """
-            select id, content, metadata, distance_score(embedding) as score
-            from embeddings
-            where {where}
-            order by score desc limit {number}
-        """.format(
-                    where=" and ".join(where_bits),
-                    number=number,
+            select id, content, metadata from embeddings
+            where collection_id = ? and id in ({})
+            """.format(
+                    ", ".join("?" for _ in ids)
                 ),
-                where_args,
+                [self.id] + ids,
             )
+        }
+        return [
+            Entry(
+                id=id,
+                score=float(score),
+                content=rows[id]["content"],
+                metadata=(
+                    _json_loads(rows[id]["metadata"]) if rows[id]["metadata"] else None
+                ),
+            )
+            for id, score in zip(ids, scores)
         ]
 
+    def _matrix_cache_version(self) -> Tuple[int, int]:
+        """
+        Changes whenever the database is written to: data_version tracks commits
+        from other connections, total_changes tracks writes on this connection.
+        """
+        data_version = self.db.execute("pragma data_version").fetchone()[0]
+        return data_version, self.db.conn.total_changes
+
+    def _check_matrix(self) -> None:
+        "Mark the cached matrix as dirty if the database changed underneath it"
+        if not self._dirty and self._matrix_version != self._matrix_cache_version():
+            self._dirty = True
+
+    def _load_matrix(self):
+        "Return the (N, D) matrix of embeddings, loading it from the database if needed"
+        np = _numpy()
+        self._check_matrix()
+        if self._dirty:
+            paths = self._matrix_file_paths() if self.mmap else None
+            fingerprint = self._matrix_fingerprint() if paths else None
+            if fingerprint is None:
+                # No file for a collection that has been deleted
+                paths = None
+            loaded = self._read_matrix_file(paths, fingerprint) if paths else None
+            if loaded is not None:
+                self._matrix, self._ids = loaded
+            else:
+                rows = self.db.execute(
+                    "select id, embedding from embeddings where collection_id = ? order by rowid",
+                    [self.id],
+                ).fetchall()
+                self._matrix = _decode_matrix(
+                    [embedding for _, embedding in rows],
+                    QUANTIZATIONS[self.quantization],
+                )
+                if self._matrix.dtype != np.int8:
+                    _normalize_rows(self._matrix)
+                self._ids = [id for id, _ in rows]
+                if paths and rows:
+                    self._write_matrix_file(paths, fingerprint, self._matrix, self._ids)
+            self._matrix_count = len(self._ids)
+            self._id_positions = {id: i for i, id in enumerate(self._ids)}
+            self._matrix_version = self._matrix_cache_version()
+            self._dirty = False
+            self._index = None
+            self._float_matrix = None
+        return self._matrix[: self._matrix_count]
+
+    def _scoring_matrix(self, matrix):
+        """
+        The matrix to score queries against. Only SimSIMD can score int8 and
+        float16 matrices directly, so otherwise they are converted to normalized
+        float32 once and kept up to date, rather than converted for every search.
+        """
+        np = _numpy()
+        simsimd = _simsimd()
+        if matrix.dtype == np.float32 or simsimd is not None:
+            return matrix
+        if self._float_matrix is None:
+            self._float_matrix = np.empty(self._matrix.shape, dtype=np.float32)
+            self._float_matrix[: self._matrix_count] = matrix
+            _normalize_rows(self._float_matrix[: self._matrix_count])
+        return self._float_matrix[: self._matrix_count]
+
+    def _matrix_file_paths(self) -> Optional[Tuple[str, str]]:
+        """
+        Paths to the memory-mapped .npy copy of the matrix and its .json list of IDs,
+        or None if the database is in memory.
+        """
+        filename = next(
+            (
+                row[2]
+                for row in self.db.execute("pragma database_list")
+                if row[1] == "main"
+            ),
+            "",
+        )
+        if not filename:
+            return None
+        base = "{}-collection-{}".format(filename, self.id)
+        return base + ".npy", base + ".json"
+
+    def _matrix_fingerprint(self) -> Optional[List[Any]]:
+        """
+        Changes whenever embeddings in the collection are inserted, updated or
+        deleted, via the triggers that maintain collections.version. The random
+        token tells apart collections that reuse the ID of a deleted one.
+        Returns None if the collection no longer exists.
+        """
+        row = self.db.execute(
+            "select token, version from collections where id = ?", [self.id]
+        ).fetchone()
+        return list(row) if row else None
+
+    def _read_matrix_file(self, paths: Tuple[str, str], fingerprint: Any):
+        "Memory-map the saved matrix, if it exists and matches the database"
+        np = _numpy()
+        npy_path, json_path = paths
+        try:
+            with open(json_path) as fp:
+                saved = json.load(fp)
+            if saved["fingerprint"] != fingerprint:
+                return None
+            # asarray() drops the np.memmap subclass without copying the data
+            matrix = np.asarray(np.load(npy_path, mmap_mode="r"))
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(matrix) != len(saved["ids"]):
+            return None
+        return matrix, saved["ids"]
+
+    def _write_matrix_file(
+        self, paths: Tuple[str, str], fingerprint: Any, matrix, ids: List[str]
+    ) -> None:
+        "Save the matrix for later instances to memory-map, if possible"
+        np = _numpy()
+        npy_path, json_path = paths
+        directory = os.path.dirname(npy_path) or "."
+        temp_paths = []
+        try:
+            # Write to uniquely named temporary files and rename, so readers never
+            # see partial files and other processes writing them can't collide
+            fd, temp_npy_path = tempfile.mkstemp(suffix=".npy", dir=directory)
+            temp_paths.append(temp_npy_path)
+            with os.fdopen(fd, "wb") as fp:
+                np.save(fp, matrix)
+            fd, temp_json_path = tempfile.mkstemp(suffix=".json", dir=directory)
+            temp_paths.append(temp_json_path)
+            with os.fdopen(fd, "w") as fp:
+                json.dump({"fingerprint": fingerprint, "ids": ids}, fp)
+            os.replace(temp_npy_path, npy_path)
+            os.replace(temp_json_path, json_path)
+        except OSError:
+            # Read-only directory, full disk, or on Windows a file that another
+            # process has memory-mapped - searches work fine without the file
+            for path in temp_paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _append_to_matrix(self, ids, blobs: List[bytes]) -> None:
+        "Add newly stored embeddings to the cached matrix, if it has been loaded"
+        np = _numpy()
+        if self._dirty or not ids:
+            return
+        try:
+            new_rows = _decode_matrix(blobs, QUANTIZATIONS[self.quantization])
+        except ValueError:
+            new_rows = None
+        if new_rows is None or new_rows.shape[1] != self._matrix.shape[1]:
+            self._dirty = True
+            return
+        if new_rows.dtype != np.int8:
+            _normalize_rows(new_rows)
+        if not self._matrix.flags.writeable:
+            # Memory-mapped from disk, so switch to an in-memory copy
+            self._matrix = np.array(self._matrix)
+        positions = []
+        for id, vector in zip(ids, new_rows):
+            id = str(id)
+            position = self._id_positions.get(id)
+            if position is not None and self._index is not None:
+                self._index.remove(position)
+            if position is None:
+                if self._matrix_count == len(self._matrix):
+                    # Grow geometrically so repeated appends stay amortized O(1)
+                    grown = np.empty(
+                        (max(2 * len(self._matrix), 16), self._matrix.shape[1]),
+                        dtype=self._matrix.dtype,
+                    )
+                    grown[: self._matrix_count] = self._matrix[: self._matrix_count]
+                    self._matrix = grown
+                position = self._matrix_count
+                self._matrix_count += 1
+                self._ids.append(id)
+                self._id_positions[id] = position
+            self._matrix[position] = vector
+            positions.append(position)
+            if self._index is not None:
+                self._index.add(position, vector)
+        if self._float_matrix is not None:
+            if len(self._float_matrix) < len(self._matrix):
+                grown = np.empty(self._matrix.shape, dtype=np.float32)
+                grown[: len(self._float_matrix)] = self._float_matrix
+                self._float_matrix = grown
+            float_rows = new_rows.astype(np.float32)
+            _normalize_rows(float_rows)
+            self._float_matrix[positions] = float_rows
+        self._matrix_version = self._matrix_cache_version()
+
+    def _similar_by_vector_python(
+        self, vector: List[float], number: int, skip_id: Optional[str]
+    ) -> List[Entry]:
+        "Fallback for when NumPy is not installed: score each row in Python"
+        import llm
+
+        where_bits = ["collection_id = ?"]
+        where_args = [str(self.id)]
+
+        if skip_id:
+            where_bits.append("id != ?")
+            where_args.append(skip_id)
+
+        # SQLite is only used to filter rows - scoring them with a registered
+        # function would cost a C to Python call for every row
+        top = heapq.nlargest(
+            number,
+            (
+                (
+                    # Cosine similarity ignores magnitude, so any quantization
+                    # scale can be left out
+                    llm.cosine_similarity(
+                        self._decode_embedding(embedding, 1.0), vector
+                    ),
+                    id,
+                )
+                for id, embedding in self.db.execute(
+                    "select id, embedding from embeddings where {}".format(
+                        " and ".join(where_bits)
+                    ),
+                    where_args,
+                )
+            ),
+            key=lambda score_and_id: score_and_id[0],
+        )
+        return self._entries([id for _, id in top], [score for score, _ in top])
+
     def similar_by_id(self, id: str, number: int = 10) -> List[Entry]:
         """
         Find similar items in the collection by a given ID.
@@ -297,17 +992,16 @@ class Collection:
         Returns:
             list: List of Entry objects
         """
-        import llm
-
-        matches = list(
-            self.db["embeddings"].rows_where(
-                "collection_id = ? and id = ?", (self.id, id)
-            )
-        )
-        if not matches:
+        match = self.db.execute(
+            """
+            select embedding, embedding_scale from embeddings
+            where collection_id = ? and id = ? limit 1
+            """,
+            (self.id, id),
+        ).fetchone()
+        if match is None:
             raise self.DoesNotExist("ID not found")
-        embedding = matches[0]["embedding"]
-        comparison_vector = llm.decode(embedding)
+        comparison_vector = self._decode_embedding(*match)
         return self.similar_by_vector(comparison_vector, number, skip_id=id)
 
     def similar(self, value: Union[str, bytes], number: int = 10) -> List[Entry]:
@@ -324,6 +1018,31 @@ class Collection:
         comparison_vector = self.model().embed(value)
         return self.similar_by_vector(comparison_vector, number)
 
+    def _encode_embedding(
+        self, embedding: Iterable[float]
+    ) -> Tuple[bytes, Optional[float]]:
+        "Encode an embedding for storage, returning the bytes and any quantization scale"
+        import llm
+
+        if self.quantization == "i8":
+            return quantize_i8(embedding)
+        if self.quantization == "f16":
+            # Cosine similarity ignores magnitude, and a unit vector can't
+            # overflow float16 or lose its smallest components to underflow
+            values = _unit_vector(embedding)
+            return struct.pack("<" + "e" * len(values), *values), None
+        return llm.encode(embedding), None
+
+    def _decode_embedding(self, binary: bytes, scale: Optional[float]) -> List[float]:
+        "Decode a stored embedding back into a list of floats"
+        import llm
+
+        if self.quantization == "i8":
+            return dequantize_i8(binary, scale or 1.0)
+        if self.quantization == "f16":
+            return list(struct.unpack("<" + "e" * (len(binary) // 2), binary))
+        return list(llm.decode(binary))
+
     @classmethod
     def exists(cls, db: Database, name: str) -> bool:
         """
@@ -342,6 +1061,15 @@ class Collection:
         with self.db.conn:
             self.db.execute("delete from embeddings where collection_id = ?", [self.id])
             self.db.execute("delete from collections where id = ?", [self.id])
+        # Release any memory-mapped file, so that it can be removed on Windows
+        self._matrix = self._float_matrix = self._index = None
+        self._dirty = True
+        for path in self._matrix_file_paths() or ():
+            try:
+                os.remove(path)
+            except OSError:
+                # Missing, or memory-mapped by another process on Windows
+                pass
 
     @staticmethod
     def content_hash(input: Union[str, bytes]) -> bytes:
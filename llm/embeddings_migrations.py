@@ -91,3 +91,51 @@ def m005_add_content_blob(db):
     db["embeddings"].transform(
         column_order=("collection_id", "id", "embedding", "content", "content_blob")
     )
+
+
+@embeddings_migrations()
+def m006_add_quantization(db):
+    db["collections"].add_column("quantization", str)
+    # Pretty-print the schema
+    db["collections"].transform()
+    # No transform() here - that would copy the whole embeddings table
+    db["embeddings"].add_column("embedding_scale", float)
+
+
+@embeddings_migrations()
+def m007_add_collection_version(db):
+    db["collections"].add_column("version", int, not_null_default=0)
+    # Pretty-print the schema
+    db["collections"].transform()
+    # Bump the version whenever a collection's embeddings change, so copies of
+    # them saved outside the database can tell when they are out of date
+    db.executescript(
+        """
+        create trigger embeddings_insert_version after insert on embeddings
+        begin
+            update collections set version = version + 1
+            where id = new.collection_id;
+        end;
+        create trigger embeddings_update_version
+        after update of collection_id, id, embedding on embeddings
+        begin
+            update collections set version = version + 1
+            where id in (old.collection_id, new.collection_id);
+        end;
+        create trigger embeddings_delete_version after delete on embeddings
+        begin
+            update collections set version = version + 1
+            where id = old.collection_id;
+        end;
+        """
+    )
+
+
+@embeddings_migrations()
+def m008_add_collection_token(db):
+    # No transform() here - the triggers from m007 would stop it renaming the table
+    db["collections"].add_column("token", str)
+    # A random value for each collection, so that files saved for a deleted
+    # collection can't be mistaken for a new one that reuses its ID
+    with db.conn:
+        db.execute("update collections set token = lower(hex(randomblob(16)))")
@@ -54,6 +54,11 @@ setup(
         "test": [
             "pytest",
             "numpy",
+            "simsimd",
+            "numba",
+            "usearch",
+            "orjson",
+            "threadpoolctl",
             "pytest-httpx>=0.33.0",
             "pytest-asyncio",
             "cogapp",
@@ -1,8 +1,14 @@
+import datetime
 import json
 import llm
 from llm.embeddings import Entry
+import math
+import numpy as np
+import os
 import pytest
 import sqlite_utils
+import struct
+import sys
 from unittest.mock import ANY
 
 
@@ -55,6 +61,38 @@ def test_embed_metadata(collection):
     assert entry.content == "hello yet again"
 
 
+@pytest.mark.parametrize("use_orjson", (False, True))
+def test_embed_metadata_json(collection, monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(llm.embeddings, "_orjson", lambda: None)
+    metadata = {"foo": ["bar", 1.5, None], 2: {"nested": True}}
+    collection.embed_multi_with_metadata([("3", "hello again", metadata)])
+    entry = [entry for entry in collection.similar("hello again") if entry.id == "3"][0]
+    assert entry.metadata == {"foo": ["bar", 1.5, None], "2": {"nested": True}}
+    # orjson writes compact JSON, even when there are null values
+    metadata = {"note": "annulled", "café": None}
+    collection.embed_multi_with_metadata([("5", "hello annulled", metadata)])
+    stored = collection.db["embeddings"].get((collection.id, "5"))["metadata"]
+    if use_orjson:
+        assert stored == '{"note":"annulled","café":null}'
+    else:
+        assert stored == '{"note": "annulled", "caf\\u00e9": null}'
+    # Types only orjson accepts are rejected either way
+    with pytest.raises(TypeError):
+        collection.embed("6", "hello date", metadata={"date": datetime.date.today()})
+    # Values orjson can't write the same way are stored exactly as json.dumps() would
+    metadata = {"big": 2**70, "nan": float("nan"), "inf": float("inf")}
+    collection.embed_multi_with_metadata([("4", "big numbers", metadata)])
+    stored = collection.db["embeddings"].get((collection.id, "4"))["metadata"]
+    assert stored == json.dumps(metadata)
+    entry = [entry for entry in collection.similar("big numbers") if entry.id == "4"][0]
+    assert entry.metadata["big"] == 2**70
+    assert math.isnan(entry.metadata["nan"])
+    assert entry.metadata["inf"] == float("inf")
+
+
 def test_collection(collection):
     assert collection.id == 1
     assert collection.count() == 2
@@ -65,6 +103,7 @@ def test_collection(collection):
             "collection_id": 1,
             "id": "1",
             "embedding": llm.encode([5, 5, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
+            "embedding_scale": None,
             "content": None,
             "content_blob": None,
             "content_hash": collection.content_hash("hello world"),
@@ -75,6 +114,7 @@ def test_collection(collection):
             "collection_id": 1,
             "id": "2",
             "embedding": llm.encode([7, 5, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
+            "embedding_scale": None,
             "content": None,
             "content_blob": None,
             "content_hash": collection.content_hash("goodbye world"),
@@ -93,11 +133,422 @@ def test_similar(collection):
     ]
 
 
+@pytest.mark.parametrize("use_numba", (False, True))
+def test_similar_without_simsimd(collection, monkeypatch, use_numba):
+    monkeypatch.setattr(llm.embeddings, "_simsimd", lambda: None)
+    monkeypatch.setattr(llm.embeddings, "_blas_is_threaded", lambda: False)
+    calls = []
+    if use_numba:
+        pytest.importorskip("numba")
+        kernels = llm.embeddings._numba_kernels()
+        dot_scores = kernels.dot_scores
+        monkeypatch.setattr(
+            kernels, "dot_scores", lambda *args: calls.append(args) or dot_scores(*args)
+        )
+        monkeypatch.setattr(llm.embeddings, "PARALLEL_SCAN_ROWS", 1)
+    else:
+        # Small scans use the BLAS product rather than paying for Numba's startup
+        monkeypatch.setattr(
+            llm.embeddings, "_numba_kernels", lambda: pytest.fail("Numba was used")
+        )
+    results = list(collection.similar("hello world"))
+    assert results == [
+        Entry(id="1", score=pytest.approx(0.9999999999999999)),
+        Entry(id="2", score=pytest.approx(0.9863939238321437)),
+    ]
+    assert len(calls) == (1 if use_numba else 0)
+
+
+def test_similar_parallel_scan(collection, monkeypatch):
+    expected = collection.similar("hello world")
+    monkeypatch.setattr(llm.embeddings, "_simsimd", lambda: None)
+    monkeypatch.setattr(llm.embeddings, "_numba_kernels", lambda: None)
+    monkeypatch.setattr(llm.embeddings, "PARALLEL_SCAN_ROWS", 1)
+    monkeypatch.setattr(llm.embeddings, "_blas_is_threaded", lambda: False)
+    monkeypatch.setattr(llm.embeddings.os, "cpu_count", lambda: 2)
+    results = collection.similar("hello world")
+    assert [entry.id for entry in results] == [entry.id for entry in expected]
+    assert [entry.score for entry in results] == [
+        pytest.approx(entry.score) for entry in expected
+    ]
+
+
+@pytest.mark.parametrize(
+    "env,expected",
+    (
+        ({}, True),
+        ({"OPENBLAS_NUM_THREADS": "1"}, False),
+        ({"OMP_NUM_THREADS": "1"}, False),
+        ({"MKL_NUM_THREADS": "4"}, True),
+    ),
+)
+def test_blas_is_threaded_without_threadpoolctl(monkeypatch, env, expected):
+    monkeypatch.setattr(llm.embeddings, "_threadpoolctl", lambda: None)
+    for name in ("OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "OMP_NUM_THREADS"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    llm.embeddings._blas_is_threaded.cache_clear()
+    try:
+        assert llm.embeddings._blas_is_threaded() is expected
+    finally:
+        llm.embeddings._blas_is_threaded.cache_clear()
+
+
+def test_similar_without_numpy(collection, monkeypatch):
+    expected = collection.similar("hello world")
+    monkeypatch.setattr(llm.embeddings, "_numpy", lambda: None)
+    results = collection.similar("hello world")
+    assert [entry.id for entry in results] == [entry.id for entry in expected]
+    assert [entry.score for entry in results] == [
+        pytest.approx(entry.score) for entry in expected
+    ]
+
+
+def test_similar_matrix_cache(collection):
+    assert [entry.id for entry in collection.similar("hello world")] == ["1", "2"]
+    # New and replaced embeddings are applied to the already loaded matrix
+    collection.embed("3", "hello there")
+    collection.embed("2", "hello world!")
+    assert not collection._dirty
+    assert collection._ids == ["1", "2", "3"]
+    # Cached rows are normalized so cosine similarity is a single dot product
+    matrix = collection._matrix[: collection._matrix_count]
+    assert np.linalg.norm(matrix, axis=1) == pytest.approx([1.0, 1.0, 1.0])
+    results = collection.similar("hello world")
+    assert [entry.id for entry in results] == ["1", "3", "2"]
+    assert [entry.score for entry in results] == [
+        pytest.approx(1.0),
+        pytest.approx(1.0),
+        pytest.approx(0.9958932064677039),
+    ]
+    # Writes that bypass the collection cause the matrix to be reloaded
+    collection.db["embeddings"].delete_where("id = ?", ["3"])
+    assert [entry.id for entry in collection.similar("hello world")] == ["1", "2"]
+    assert collection._ids == ["1", "2"]
+
+
+def test_similar_mismatched_dimensions(collection):
+    collection.db["embeddings"].insert(
+        {"collection_id": collection.id, "id": "3", "embedding": llm.encode([1, 2])}
+    )
+    with pytest.raises(ValueError):
+        collection.similar("hello world")
+
+
+@pytest.mark.parametrize("number", (0, 1, 2, 3, 10))
+def test_similar_number(collection, number):
+    collection.embed("3", "hello there!")
+    collection.embed("4", "goodbye there friend")
+    results = collection.similar("hello world", number=number)
+    assert [entry.id for entry in results] == ["1", "3", "2", "4"][:number]
+
+
+def test_similar_negative_number(collection, scoring_backend):
+    with pytest.raises(ValueError):
+        collection.similar("hello world", number=-1)
+    with pytest.raises(ValueError):
+        collection.similar_by_vectors([[1] * 16], number=-1)
+
+
+def test_similar_by_zero_vector(collection, scoring_backend):
+    with pytest.raises(ValueError):
+        collection.similar_by_vector([0] * 16)
+    with pytest.raises(ValueError):
+        collection.similar_by_vectors([[1] * 16, [0] * 16])
+
+
+@pytest.mark.parametrize("quantization", (None, "i8", "f16"))
+def test_similar_by_vectors(scoring_backend, quantization):
+    db = sqlite_utils.Database(memory=True)
+    collection = llm.Collection(
+        "test", db, model_id="embed-demo", quantization=quantization
+    )
+    collection.embed_multi(
+        [
+            ("1", "hello world"),
+            ("2", "goodbye world"),
+            ("3", "hello there!"),
+            ("4", "goodbye there friend"),
+        ]
+    )
+    model = collection.model()
+    queries = [model.embed("hello world"), model.embed("goodbye everyone")]
+    results = collection.similar_by_vectors(queries, number=3)
+    assert len(results) == 2
+    for query, batch_results in zip(queries, results):
+        expected = collection.similar_by_vector(query, number=3)
+        assert [entry.id for entry in batch_results] == [entry.id for entry in expected]
+        assert [entry.score for entry in batch_results] == [
+            pytest.approx(entry.score, rel=1e-3) for entry in expected
+        ]
+    if scoring_backend != "python":
+        assert collection.similar_by_vectors(np.array(queries), number=3) == results
+    assert collection.similar_by_vectors([]) == []
+
+
+@pytest.mark.parametrize("quantization", (None, "i8", "f16"))
+def test_build_index(quantization):
+    pytest.importorskip("usearch")
+    collection = llm.Collection(
+        "test", model_id="embed-demo", quantization=quantization
+    )
+    collection.build_index()
+    collection.embed_multi(
+        [("1", "hello world"), ("2", "goodbye world"), ("3", "hi world")]
+    )
+    expected = [("2", 0.9863939238321437), ("3", 0.9191450300180579)]
+    assert collection._index is None
+    results = collection.similar_by_id("1")
+    assert collection._index is not None
+    assert [(entry.id, entry.score) for entry in results] == [
+        (id, pytest.approx(score, rel=1e-3)) for id, score in expected
+    ]
+    # New and replaced embeddings are added to the existing index
+    index = collection._index
+    collection.embed("3", "hello world!")
+    collection.embed("4", "greetings world")
+    assert collection._index is index
+    assert len(index) == 4
+    assert [entry.id for entry in collection.similar("hello world", number=2)] == [
+        "1",
+        "3",
+    ]
+    assert collection.similar("hello world", number=0) == []
+    with pytest.raises(ValueError):
+        collection.similar("hello world", number=-1)
+
+
+def test_build_index_without_usearch(monkeypatch):
+    monkeypatch.setitem(sys.modules, "usearch.index", None)
+    collection = llm.Collection("test", model_id="embed-demo")
+    with pytest.raises(ImportError):
+        collection.build_index()
+
+
+def test_collection_mmap(tmpdir):
+    db_path = str(tmpdir / "embeddings.db")
+    collection = llm.Collection(
+        "test", sqlite_utils.Database(db_path), model_id="embed-demo", mmap=True
+    )
+    collection.embed_multi([("1", "hello world"), ("2", "goodbye world")])
+    expected = collection.similar("hello world")
+    json_path = db_path + "-collection-1.json"
+    assert tmpdir.join("embeddings.db-collection-1.npy").exists()
+    # A new instance memory-maps the saved matrix instead of decoding the rows
+    collection2 = llm.Collection("test", sqlite_utils.Database(db_path), mmap=True)
+    assert collection2.similar("hello world") == expected
+    assert not collection2._matrix.flags.writeable
+    # Writes switch to an in-memory copy, and make the saved file stale
+    collection2.embed("3", "hello there!")
+    assert [entry.id for entry in collection2.similar("hello world")] == [
+        "1",
+        "3",
+        "2",
+    ]
+    with open(json_path) as fp:
+        assert json.load(fp)["ids"] == ["1", "2"]
+    collection3 = llm.Collection("test", sqlite_utils.Database(db_path), mmap=True)
+    assert len(collection3.similar("hello world")) == 3
+    with open(json_path) as fp:
+        assert json.load(fp)["ids"] == ["1", "2", "3"]
+    # Deleting the newest row and inserting another can reuse its rowid
+    collection3.db["embeddings"].delete_where("id = ?", ["3"])
+    collection3.embed("4", "goodbye there friend")
+    collection4 = llm.Collection("test", sqlite_utils.Database(db_path), mmap=True)
+    assert [entry.id for entry in collection4.similar("hello world")] == [
+        "1",
+        "2",
+        "4",
+    ]
+    # Updates in place keep the same rowid too
+    collection4.db["embeddings"].update(
+        (collection4.id, "4"), {"embedding": llm.encode([5, 5] + [0] * 14)}
+    )
+    collection5 = llm.Collection("test", sqlite_utils.Database(db_path), mmap=True)
+    assert [
+        (entry.id, entry.score) for entry in collection5.similar("hello world")
+    ] == [
+        ("1", pytest.approx(1.0)),
+        ("4", pytest.approx(1.0)),
+        ("2", pytest.approx(0.9863939238321437)),
+    ]
+    collection5.delete()
+    assert collection5.similar("hello world") == []
+    assert not tmpdir.join("embeddings.db-collection-1.npy").exists()
+    assert not tmpdir.join("embeddings.db-collection-1.json").exists()
+
+
+def test_collection_mmap_recreated(tmpdir):
+    db_path = str(tmpdir / "embeddings.db")
+    collection = llm.Collection(
+        "test", sqlite_utils.Database(db_path), model_id="embed-demo", mmap=True
+    )
+    collection.embed_multi([("1", "hello world"), ("2", "goodbye world")])
+    collection.similar("hello world")
+    npy_path = tmpdir / "embeddings.db-collection-1.npy"
+    assert npy_path.exists()
+    # Deleting without mmap=True still removes the saved files
+    llm.Collection("test", sqlite_utils.Database(db_path)).delete()
+    assert not npy_path.exists()
+    # A new collection reusing the ID doesn't pick up files saved for the old one
+    collection = llm.Collection(
+        "test", sqlite_utils.Database(db_path), model_id="embed-demo", mmap=True
+    )
+    assert collection.id == 1
+    collection.embed_multi([("1", "goodbye there world"), ("2", "hello world")])
+    collection.similar("hello world")
+    # Deleting the rows directly leaves the saved files behind
+    with collection.db.conn:
+        collection.db.execute("delete from embeddings")
+        collection.db.execute("delete from collections")
+    collection = llm.Collection(
+        "test", sqlite_utils.Database(db_path), model_id="embed-demo", mmap=True
+    )
+    collection.embed_multi([("1", "hello world"), ("2", "goodbye there world")])
+    results = llm.Collection("test", sqlite_utils.Database(db_path), mmap=True).similar(
+        "hello world"
+    )
+    assert [entry.id for entry in results] == ["1", "2"]
+    # Nor does a new database file with the same name
+    os.remove(db_path)
+    collection = llm.Collection(
+        "test", sqlite_utils.Database(db_path), model_id="embed-demo", mmap=True
+    )
+    collection.embed_multi([("3", "hello world")])
+    results = llm.Collection("test", sqlite_utils.Database(db_path), mmap=True).similar(
+        "hello world"
+    )
+    assert [entry.id for entry in results] == ["3"]
+
+
+def test_collection_mmap_write_errors(tmpdir, monkeypatch):
+    directory = tmpdir.mkdir("db")
+    db_path = str(directory / "embeddings.db")
+    collection = llm.Collection(
+        "test", sqlite_utils.Database(db_path), model_id="embed-demo", mmap=True
+    )
+    collection.embed_multi([("1", "hello world"), ("2", "goodbye world")])
+
+    def replace(src, dst):
+        raise PermissionError(dst)
+
+    monkeypatch.setattr(llm.embeddings.os, "replace", replace)
+    assert [entry.id for entry in collection.similar("hello world")] == ["1", "2"]
+    # The temporary files are cleaned up
+    assert [path.basename for path in directory.listdir()] == ["embeddings.db"]
+
+    def remove(path):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(llm.embeddings.os, "remove", remove)
+    collection.delete()
+    assert not llm.Collection.exists(collection.db, "test")
+
+
 def test_similar_by_id(collection):
     results = list(collection.similar_by_id("1"))
     assert results == [
         Entry(id="2", score=pytest.approx(0.9863939238321437)),
     ]
+    with pytest.raises(llm.Collection.DoesNotExist):
+        collection.similar_by_id("missing")
+
+
+@pytest.fixture(params=("simsimd", "numba", "numpy", "python"))
+def scoring_backend(request, monkeypatch):
+    backend = request.param
+    if backend == "simsimd":
+        pytest.importorskip("simsimd")
+    else:
+        monkeypatch.setattr(llm.embeddings, "_simsimd", lambda: None)
+    if backend == "numba":
+        pytest.importorskip("numba")
+        monkeypatch.setattr(llm.embeddings, "PARALLEL_SCAN_ROWS", 1)
+        monkeypatch.setattr(llm.embeddings, "_blas_is_threaded", lambda: False)
+    else:
+        monkeypatch.setattr(llm.embeddings, "_numba_kernels", lambda: None)
+    if backend == "python":
+        monkeypatch.setattr(llm.embeddings, "_numpy", lambda: None)
+    return backend
+
+
+def test_collection_quantization_i8(scoring_backend):
+    db = sqlite_utils.Database(memory=True)
+    collection = llm.Collection("test", db, model_id="embed-demo", quantization="i8")
+    collection.embed("1", "hello world")
+    collection.embed_multi([("2", "goodbye world"), ("3", "hi world")])
+    rows = list(db["embeddings"].rows)
+    assert [len(row["embedding"]) for row in rows] == [16, 16, 16]
+    assert rows[0]["embedding_scale"] == pytest.approx(127 / 0.5**0.5)
+    assert (
+        llm.embeddings.dequantize_i8(rows[0]["embedding"], rows[0]["embedding_scale"])[
+            :2
+        ]
+        == [pytest.approx(0.5**0.5, rel=1e-2)] * 2
+    )
+    results = collection.similar_by_id("1")
+    assert [entry.id for entry in results] == ["2", "3"]
+    assert [entry.score for entry in results] == [
+        pytest.approx(0.9863939238321437, rel=1e-3),
+        pytest.approx(0.9191450300180579, rel=1e-3),
+    ]
+    # Quantization is persisted with the collection
+    assert llm.Collection("test", db).quantization == "i8"
+    llm.Collection("plain", db, model_id="embed-demo")
+    with pytest.raises(ValueError):
+        llm.Collection("plain", db, quantization="i8")
+    with pytest.raises(ValueError):
+        llm.Collection("other", db, model_id="embed-demo", quantization="i4")
+
+
+def test_collection_quantization_f16(scoring_backend):
+    db = sqlite_utils.Database(memory=True)
+    collection = llm.Collection("test", db, model_id="embed-demo", quantization="f16")
+    collection.embed("1", "hello world")
+    collection.embed_multi([("2", "goodbye world"), ("3", "hi world")])
+    rows = list(db["embeddings"].rows)
+    assert [len(row["embedding"]) for row in rows] == [32, 32, 32]
+    assert rows[0]["embedding"] == struct.pack("<16e", 0.5**0.5, 0.5**0.5, *([0] * 14))
+    # Stored as unit vectors, so large values can't overflow float16
+    assert collection._encode_embedding([100000, 100000] + [0] * 14) == (
+        rows[0]["embedding"],
+        None,
+    )
+    results = collection.similar_by_id("1")
+    assert [entry.id for entry in results] == ["2", "3"]
+    assert [entry.score for entry in results] == [
+        pytest.approx(0.9863939238321437, rel=1e-3),
+        pytest.approx(0.9191450300180579, rel=1e-3),
+    ]
+    assert llm.Collection("test", db).quantization == "f16"
+
+
+@pytest.mark.parametrize("quantization", ("i8", "f16"))
+def test_collection_quantization_float_matrix(monkeypatch, quantization):
+    monkeypatch.setattr(llm.embeddings, "_simsimd", lambda: None)
+    db = sqlite_utils.Database(memory=True)
+    collection = llm.Collection(
+        "test", db, model_id="embed-demo", quantization=quantization
+    )
+    collection.embed_multi([("1", "hello world"), ("2", "goodbye world")])
+    assert [entry.id for entry in collection.similar("hello world")] == ["1", "2"]
+    # Converted to float32 once, then updated in place as embeddings are added
+    float_matrix = collection._float_matrix
+    assert float_matrix.dtype == np.float32
+    collection.similar("hello world")
+    assert collection._float_matrix is float_matrix
+    collection.embed("2", "hello world!")
+    collection.embed_multi([(str(i), "hi " * i) for i in range(3, 20)])
+    assert not collection._dirty
+    matrix = collection._float_matrix[: collection._matrix_count]
+    assert np.linalg.norm(matrix, axis=1) == pytest.approx([1.0] * 19, rel=1e-3)
+    results = collection.similar("hello world", number=2)
+    assert [entry.id for entry in results] == ["1", "2"]
+    assert [entry.score for entry in results] == [
+        pytest.approx(1.0, rel=1e-3),
+        pytest.approx(0.9958932064677039, rel=1e-3),
+    ]
 
 
 @pytest.mark.parametrize(
@@ -139,6 +590,44 @@ def test_embed_multi(with_metadata, batch_size, expected_batches):
     assert collection.model().batch_count == expected_batches
 
 
+def test_embed_multi_skips_existing(collection):
+    model = collection.model()
+    model.embedded_content.clear()
+    collection.embed_multi(
+        [
+            ("1", "hello world"),
+            ("2", "goodbye world, again"),
+            (3, "hello there"),
+            (3, "hello there"),
+        ]
+    )
+    # Unchanged items, and repeats within the same call, are not re-embedded
+    assert model.embedded_content == ["goodbye world, again", "hello there"]
+    assert collection.count() == 3
+    model.embedded_content.clear()
+    collection.embed_multi([("3", "hello there"), ("4", "hello world")])
+    assert model.embedded_content == ["hello world"]
+
+
+def test_embed_multi_model_error():
+    class FailingModel(llm.EmbeddingModel):
+        model_id = "failing"
+        batch_size = 2
+
+        def embed_batch(self, texts):
+            texts = list(texts)
+            if "bad" in texts:
+                raise ValueError("Bad text")
+            return ([len(text), 1.0] for text in texts)
+
+    collection = llm.Collection("test", model=FailingModel())
+    entries = [("1", "one"), ("2", "two"), ("3", "three"), ("4", "bad")]
+    with pytest.raises(ValueError, match="Bad text"):
+        collection.embed_multi(entries, batch_size=2)
+    # Batches before the failing one were still written
+    assert collection.count() == 2
+
+
 def test_collection_delete(collection):
     db = collection.db
     assert db["embeddings"].count == 2
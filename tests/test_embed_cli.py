@@ -104,11 +104,25 @@ def test_embed_store(user_path, metadata, metadata_error):
     # Check the contents
     db = sqlite_utils.Database(str(embeddings_db))
     rows = list(db["collections"].rows)
-    assert rows == [{"id": 1, "name": "items", "model": "embed-demo"}]
+    assert rows == [
+        {
+            "id": 1,
+            "name": "items",
+            "model": "embed-demo",
+            "quantization": None,
+            "version": 1,
+            "token": ANY,
+        }
+    ]
     expected_metadata = None
     if metadata and not metadata_error:
-        expected_metadata = metadata
+        expected_metadata = json.loads(metadata)
     rows = list(db["embeddings"].rows)
+    # Compare parsed metadata, since the JSON formatting depends on whether orjson is installed
+    stored_metadata = rows[0].pop("metadata")
+    assert (
+        json.loads(stored_metadata) if stored_metadata else None
+    ) == expected_metadata
     assert rows == [
         {
             "collection_id": 1,
@@ -120,10 +134,10 @@ def test_embed_store(user_path, metadata, metadata_error):
                 b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
                 b"\x00\x00\x00\x00\x00\x00\x00"
             ),
+            "embedding_scale": None,
             "content": None,
             "content_blob": None,
             "content_hash": Collection.content_hash("hello"),
-            "metadata": expected_metadata,
             "updated": ANY,
         }
     ]
@@ -165,6 +179,7 @@ def test_embed_store_binary(user_path):
                 b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
                 b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
             ),
+            "embedding_scale": None,
             "content": None,
             "content_blob": b"\x00\x01\x02",
             "content_hash": b'\xb9_g\xf6\x1e\xbb\x03a\x96"\xd7\x98\xf4_\xc2\xd3',
@@ -315,6 +330,7 @@ def test_embed_multi_files_binary_store(tmpdir):
             b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
             b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
         ),
+        "embedding_scale": None,
         "content": None,
         "content_blob": b"\x00\x01\x02",
         "content_hash": b'\xb9_g\xf6\x1e\xbb\x03a\x96"\xd7\x98\xf4_\xc2\xd3',
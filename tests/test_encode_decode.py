@@ -17,3 +17,17 @@ def test_roundtrip(array):
     # Try with numpy as well
     numpy_decoded = np.frombuffer(encoded, "<f4")
     assert tuple(numpy_decoded.tolist()) == array
+
+
+@pytest.mark.parametrize("use_simsimd", (False, True))
+def test_cosine_similarity(monkeypatch, use_simsimd):
+    if use_simsimd:
+        pytest.importorskip("simsimd")
+    else:
+        monkeypatch.setattr(llm.embeddings, "_simsimd", lambda: None)
+    assert llm.cosine_similarity((5.0, 5.0), (5.0, 5.0)) == pytest.approx(1.0)
+    assert llm.cosine_similarity((5.0, 5.0), (7.0, 5.0)) == pytest.approx(
+        0.9863939238321437
+    )
+    with pytest.raises(ZeroDivisionError):
+        llm.cosine_similarity((0.0, 0.0), (5.0, 5.0))
@@ -85,7 +85,14 @@ def test_migrations_with_legacy_alter_table():
 def test_migrations_for_embeddings():
     db = sqlite_utils.Database(memory=True)
     embeddings_migrations.apply(db)
-    assert db["collections"].columns_dict == {"id": int, "name": str, "model": str}
+    assert db["collections"].columns_dict == {
+        "id": int,
+        "name": str,
+        "model": str,
+        "quantization": str,
+        "version": int,
+        "token": str,
+    }
     assert db["embeddings"].columns_dict == {
         "collection_id": int,
         "id": str,
@@ -95,6 +102,7 @@ def test_migrations_for_embeddings():
         "content_hash": bytes,
         "metadata": str,
         "updated": int,
+        "embedding_scale": float,
     }
     assert db["embeddings"].foreign_keys[0].column == "collection_id"
     assert db["embeddings"].foreign_keys[0].other_table == "collections"